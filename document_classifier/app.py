@@ -4,6 +4,7 @@ import re
 import json
 import csv
 import io
+import tempfile
 import pandas as pd
 import fitz  # PyMuPDF
 import docx
@@ -16,6 +17,10 @@ app = Flask(__name__)
 
 PORT = 5003
 
+# Uploads above this size are spooled to a temp file and opened by path
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", 8 * 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # default: system temp dir
+
 # Define regex patterns for PII detection
 PII_PATTERNS = {
     "email": r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+",
@@ -41,17 +46,45 @@ PII_PATTERNS = {
 }
 
 
-# Extract text from different file types
-def extract_text(file_stream, filename):
+# Return the upload's size without reading it
+def upload_size(uploaded_file):
+    stream = uploaded_file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+# Copy a large upload to a named temp file in chunks; the caller removes it
+def spool_upload(uploaded_file):
+    suffix = os.path.splitext(uploaded_file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=UPLOAD_SPOOL_DIR, delete=False) as dst:
+        try:
+            uploaded_file.save(dst)
+        except BaseException:
+            # The caller never gets the path, so remove the partial file here
+            dst.close()
+            os.unlink(dst.name)
+            raise
+        return dst.name
+
+
+# Extract text from different file types; `path` lets parsers open spooled files directly
+def extract_text(file_stream, filename, path=None):
     ext = os.path.splitext(filename)[1].lower()
     if ext == ".pdf":
-        doc = fitz.open(stream=file_stream.read(), filetype="pdf")
+        if path:
+            doc = fitz.open(path, filetype="pdf")
+        elif isinstance(file_stream, io.BytesIO):
+            doc = fitz.open(stream=file_stream.getvalue(), filetype="pdf")
+        else:
+            doc = fitz.open(stream=file_stream.read(), filetype="pdf")
         return "\n".join([page.get_text() for page in doc])
     elif ext == ".docx":
-        doc = docx.Document(file_stream)
+        doc = docx.Document(path or file_stream)
         return "\n".join([para.text for para in doc.paragraphs])
     elif ext == ".pptx":
-        prs = pptx.Presentation(file_stream)
+        prs = pptx.Presentation(path or file_stream)
         text = []
         for slide in prs.slides:
             for shape in slide.shapes:
@@ -68,7 +101,7 @@ def extract_text(file_stream, filename):
         reader = csv.reader(io.StringIO(decoded), delimiter=delimiter)
         return "\n".join(["\t".join(row) for row in reader])
     elif ext == ".xlsx":
-        df = pd.read_excel(file_stream, engine="openpyxl")
+        df = pd.read_excel(path or file_stream, engine="openpyxl")
         return df.to_csv(index=False, sep="\t")
     elif ext == ".json":
         data = json.load(file_stream)
@@ -117,10 +150,16 @@ def document_upload():
 
     results = []
     for uploaded_file in uploaded_files:
+        spooled_path = None
         try:
-            file_stream = io.BytesIO(uploaded_file.read())
-            file_stream.seek(0)
-            text = extract_text(file_stream, uploaded_file.filename)
+            if upload_size(uploaded_file) > UPLOAD_SPOOL_THRESHOLD:
+                spooled_path = spool_upload(uploaded_file)
+                with open(spooled_path, "rb") as file_stream:
+                    text = extract_text(file_stream, uploaded_file.filename, path=spooled_path)
+            else:
+                file_stream = io.BytesIO(uploaded_file.read())
+                file_stream.seek(0)
+                text = extract_text(file_stream, uploaded_file.filename)
             pii_types, locations = detect_pii(text, selected_types=selected_pii_types)
             summary = {
                 pii_type: len(matches) for pii_type, matches in pii_types.items()
@@ -135,6 +174,12 @@ def document_upload():
 
         except Exception as e:
             results.append({"file_name": uploaded_file.filename, "error": str(e)})
+        finally:
+            if spooled_path:
+                try:
+                    os.remove(spooled_path)
+                except OSError:
+                    pass
 
     return jsonify(results)
 
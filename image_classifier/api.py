@@ -5,7 +5,15 @@
 # api.py
 import io
 import os
-from typing import Optional, Dict, Any
+import copy
+import shutil
+import hashlib
+import tempfile
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Union, BinaryIO
 
 import numpy as np
 from PIL import Image
@@ -20,6 +28,9 @@ from fastapi.responses import JSONResponse
 import exifread
 import fitz
 
+from embedding_cache import EmbeddingCache, PerceptualIndex, Fingerprint, content_key, perceptual_fingerprint
+from ood_scorer import OODScorer
+
 # ---------------- CONFIG ----------------
 MODELS_DIR = os.getenv("MODELS_DIR", "models")
 ID_CLF_PATH = os.path.join(MODELS_DIR, "id_classifier.pkl")
@@ -28,30 +39,189 @@ CLASSES_PKL = os.path.join(MODELS_DIR, "classes.pkl")
 
 THRESH = float(os.getenv("THRESH", 0.60))           # restore sensible default
 OOD_SCORE_MIN = float(os.getenv("OOD_SCORE_MIN", -1.0))  # soften OOD gate if needed
+OOD_MODE = os.getenv("OOD_MODE", "exact").lower()       # exact | approx | sklearn
+OOD_APPROX_COMPONENTS = int(os.getenv("OOD_APPROX_COMPONENTS", 256))
+OOD_APPROX_MIN_AGREEMENT = float(os.getenv("OOD_APPROX_MIN_AGREEMENT", 0.99))
+OOD_APPROX_MAX_ERROR = float(os.getenv("OOD_APPROX_MAX_ERROR", 0.05))   # max |error| / score spread
 IMG_SIZE = (224, 224)
+DECODE_SIZE = (IMG_SIZE[0] * 2, IMG_SIZE[1] * 2)   # decode/render no larger than this before the final resize
+PDF_MAX_DPI = 200                                  # never rasterise PDF pages above the previous fixed DPI
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))          # max requests fused into one forward pass
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5.0))  # how long a request waits for others to join
+
+INFER_THREADS = int(os.getenv("INFER_THREADS", 0))                  # torch intra-op threads (0 = torch default)
+INFER_INTEROP_THREADS = int(os.getenv("INFER_INTEROP_THREADS", 0))  # torch inter-op threads (0 = torch default)
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", 4))                # threads for image decode / PDF rasterisation
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", 64))             # requests admitted before shedding with 503
+RETRY_AFTER_S = int(os.getenv("RETRY_AFTER_S", 1))                  # Retry-After sent with 503
+
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 64))             # files accepted by one /predict-batch call
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 20))                 # pages rasterised per PDF when all_pages=true
+
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", 8 * 1024 * 1024))  # larger uploads go to disk
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None                           # default: system temp dir
+
+EMB_CACHE_ITEMS = int(os.getenv("EMB_CACHE_ITEMS", 2048))           # in-memory LRU entries (0 = off)
+EMB_CACHE_DIR = os.getenv("EMB_CACHE_DIR", "")                      # on-disk memmap tier (empty = off); one shard per worker
+EMB_CACHE_DISK_ITEMS = int(os.getenv("EMB_CACHE_DISK_ITEMS", 100_000))
+EMB_CACHE_PHASH = os.getenv("EMB_CACHE_PHASH", "false").lower() in ("1", "true", "yes")  # also match re-encoded copies
+EMB_CACHE_PHASH_ITEMS = int(os.getenv("EMB_CACHE_PHASH_ITEMS", 1024))   # fingerprints kept (~16 KB each)
+EMB_DIM = 2048                                                      # ResNet50 pooled feature size
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager").lower()  # eager | torchscript | channels_last | int8
+QUANT_CALIB_DIR = os.getenv("QUANT_CALIB_DIR", "")                   # images used to calibrate the int8 backend
+QUANT_CALIB_IMAGES = int(os.getenv("QUANT_CALIB_IMAGES", 64))
+QUANT_ALLOW_RANDOM_CALIB = os.getenv("QUANT_ALLOW_RANDOM_CALIB", "false").lower() in ("1", "true", "yes")  # benchmarks only
+
+# Shared artifacts written by prepare_artifacts.py; mapped read-only/copy-on-write so
+# every uvicorn worker on a host shares the same physical pages
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE", "c") or None          # joblib mmap_mode: r | c | "" (off)
+RESNET_SHARED_WEIGHTS = os.getenv("RESNET_SHARED_WEIGHTS", os.path.join(MODELS_DIR, "resnet50_embed.pt"))
+OOD_SV_PATH = os.getenv("OOD_SV_PATH", os.path.join(MODELS_DIR, "ood_sv_f32.npy"))
+WARMUP_ITERS = int(os.getenv("WARMUP_ITERS", 2))                     # warm-up passes before reporting ready
+
+logger = logging.getLogger("image_classifier")
+if not logger.handlers:
+    # uvicorn only configures its own loggers; without a handler startup reports are dropped
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(levelname)s:     [%(process)d] %(name)s: %(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
 
 # ---------------- LOAD SKLEARN MODELS ----------------
 try:
-    clf     = joblib.load(ID_CLF_PATH)         # LogisticRegression trained on ID classes
-    ocsvm   = joblib.load(OOD_PATH)            # OneClassSVM trained on ID embeddings
+    clf     = joblib.load(ID_CLF_PATH, mmap_mode=MODEL_MMAP_MODE)   # LogisticRegression trained on ID classes
+    ocsvm   = joblib.load(OOD_PATH, mmap_mode=MODEL_MMAP_MODE)      # OneClassSVM trained on ID embeddings
     classes = joblib.load(CLASSES_PKL)         # full dataset class names in global index order
     if not isinstance(classes, (list, tuple)):
         raise ValueError("classes.pkl must be a list/tuple in classifier output order.")
 except Exception as e:
     raise RuntimeError(f"Failed to load sklearn models/classes: {e}")
 
+def load_shared_support_vectors(path: str) -> Optional[np.ndarray]:
+    """float32 support vectors from prepare_artifacts.py, memory-mapped; None if absent or stale."""
+    if not (path and os.path.isfile(path)):
+        return None
+    sv = np.load(path, mmap_mode="r")
+    if sv.shape != getattr(ocsvm, "support_vectors_", np.empty(0)).shape:
+        logger.warning("Ignoring %s: shape %s does not match ood_detector.pkl", path, sv.shape)
+        return None
+    return sv
+
+# Batched BLAS re-implementation of ocsvm.decision_function, checked against it on load
+ood_scorer = OODScorer(
+    ocsvm,
+    sv=load_shared_support_vectors(OOD_SV_PATH),
+    mode=OOD_MODE,
+    threshold=OOD_SCORE_MIN,
+    n_components=OOD_APPROX_COMPONENTS,
+    min_agreement=OOD_APPROX_MIN_AGREEMENT,
+    max_error=OOD_APPROX_MAX_ERROR,
+)
+
 # ---------------- DEVICE (CPU only) ----------------
 DEVICE = torch.device("cpu")
 
+# Must run before torch does any parallel work
+if INFER_THREADS > 0:
+    torch.set_num_threads(INFER_THREADS)
+if INFER_INTEROP_THREADS > 0:
+    try:
+        torch.set_num_interop_threads(INFER_INTEROP_THREADS)
+    except RuntimeError:
+        pass  # already initialised by an earlier import
+
+# ---------------- EXECUTORS ----------------
+# All blocking work runs here so the event loop (and /health) stays responsive.
+# A single inference thread owns the model; torch parallelises each forward pass itself.
+infer_threads: Dict[str, int] = {"intra_op": 0}   # as seen by the infer thread, for /health
+
+def set_inference_threads(n: int = INFER_THREADS) -> None:
+    """Run on inference_executor: torch thread settings apply to the calling thread."""
+    if n > 0:
+        torch.set_num_threads(n)
+    infer_threads["intra_op"] = torch.get_num_threads()
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="infer", initializer=set_inference_threads,
+)
+# Decode threads only run the small ToTensor/Normalize ops; one torch thread each keeps
+# them off the cores the inference thread's intra-op pool is sized for
+decode_executor = ThreadPoolExecutor(
+    max_workers=max(1, DECODE_WORKERS), thread_name_prefix="decode",
+    initializer=torch.set_num_threads, initargs=(1,),
+)
+
+# ---------------- TRANSFORM ----------------
+transform = transforms.Compose([
+    transforms.Resize(IMG_SIZE),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                         std =[0.229, 0.224, 0.225]),
+])
+
 # ---------------- RESNET50 (Embedding) ----------------
 RESNET_LOCAL_WEIGHTS = os.getenv("RESNET_LOCAL_WEIGHTS", None)
 
-def build_resnet50(device: torch.device) -> torch.nn.Module:
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def resnet_source_fingerprint() -> str:
+    """
+    Identifies the weights build_resnet50 loads when not using the shared artifact: the
+    content hash of RESNET_LOCAL_WEIGHTS, or the torchvision checkpoint name (which
+    embeds that checkpoint's hash). Stored in resnet50_embed.pt and the cache namespace.
+    """
+    if RESNET_LOCAL_WEIGHTS and os.path.isfile(RESNET_LOCAL_WEIGHTS):
+        return "local:sha256:" + file_sha256(RESNET_LOCAL_WEIGHTS)
+    return "torchvision:" + os.path.basename(models.ResNet50_Weights.IMAGENET1K_V1.url)
+
+RESNET_SOURCE = resnet_source_fingerprint()
+
+def load_shared_resnet50(path: str) -> Optional[torch.nn.Module]:
+    """
+    Embedding model whose parameters stay memory-mapped from the file written by
+    prepare_artifacts.py instead of being copied into each worker's heap.
+    """
+    try:
+        blob = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except Exception as e:
+        logger.warning("Ignoring %s: %s", path, e)
+        return None
+    if blob.get("source") != RESNET_SOURCE:
+        logger.warning("Ignoring %s: built from %r, expected %r", path, blob.get("source"), RESNET_SOURCE)
+        return None
+    if not blob.get("pretrained", False):
+        # Written while the pretrained weights were unavailable; retry the real source instead
+        logger.warning("Ignoring %s: holds random-init weights", path)
+        return None
+    with torch.device("meta"):
+        m = models.resnet50(weights=None)
+    m.fc = torch.nn.Identity()
+    m.load_state_dict(blob["state_dict"], assign=True)
+    m.eval()
+    m._is_pretrained = bool(blob.get("pretrained", False))
+    m._is_shared = True
+    return m
+
+def build_resnet50(device: torch.device, use_shared: bool = True) -> torch.nn.Module:
     """
-    Build ResNet50 feature extractor. If downloads are blocked, use local weights
-    via RESNET_LOCAL_WEIGHTS; otherwise fall back to weights=None (not recommended).
+    Build ResNet50 feature extractor. Prefers the shared memory-mapped weights from
+    prepare_artifacts.py. If downloads are blocked, use local weights via
+    RESNET_LOCAL_WEIGHTS; otherwise fall back to weights=None (not recommended).
     """
     try:
+        if use_shared and RESNET_SHARED_WEIGHTS and os.path.isfile(RESNET_SHARED_WEIGHTS):
+            m = load_shared_resnet50(RESNET_SHARED_WEIGHTS)
+            if m is not None:
+                return m.to(device)
+
         pretrained = False
         if RESNET_LOCAL_WEIGHTS and os.path.isfile(RESNET_LOCAL_WEIGHTS):
             m = models.resnet50(weights=None)
@@ -77,15 +247,117 @@ def build_resnet50(device: torch.device) -> torch.nn.Module:
     except Exception as e:
         raise RuntimeError(f"Failed to initialize ResNet50: {e}")
 
-resnet = build_resnet50(DEVICE)
+# ---------------- INFERENCE BACKEND ----------------
+INFERENCE_BACKENDS = ("eager", "torchscript", "channels_last", "int8")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".avif")
 
-# ---------------- TRANSFORM ----------------
-transform = transforms.Compose([
-    transforms.Resize(IMG_SIZE),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std =[0.229, 0.224, 0.225]),
-])
+def load_calibration_batches(
+    image_dir: str,
+    limit: int,
+    batch_size: int = 8,
+    allow_random: bool = False,
+) -> List[torch.Tensor]:
+    """
+    Transformed image batches for int8 calibration. Raises if image_dir has no readable
+    images, unless allow_random (benchmarks), which calibrates on random tensors instead.
+    """
+    tensors = []
+    if image_dir and os.path.isdir(image_dir):
+        for name in sorted(os.listdir(image_dir)):
+            if len(tensors) >= limit:
+                break
+            if not name.lower().endswith(IMAGE_EXTS):
+                continue
+            try:
+                with Image.open(os.path.join(image_dir, name)) as img:
+                    tensors.append(transform(img.convert("RGB")))
+            except Exception:
+                continue
+    if not tensors:
+        if not allow_random:
+            raise RuntimeError(f"INFERENCE_BACKEND=int8 needs calibration images; none found in "
+                               f"QUANT_CALIB_DIR={image_dir!r}")
+        logger.warning("No calibration images found (QUANT_CALIB_DIR=%r); calibrating int8 on random "
+                       "inputs, expect a larger accuracy drop", image_dir)
+        tensors = [torch.randn(3, *IMG_SIZE) for _ in range(max(1, min(limit, 16)))]
+    return [torch.stack(tensors[i:i + batch_size]) for i in range(0, len(tensors), batch_size)]
+
+def optimize_for_inference(
+    m: torch.nn.Module,
+    backend: str,
+    calib_batches: Optional[List[torch.Tensor]] = None,
+) -> torch.nn.Module:
+    """
+    Wrap an eager FP32 embedding model in the requested CPU inference backend:
+
+    - eager:         unchanged
+    - channels_last: NHWC weights; inputs are converted to match in run_inference
+    - torchscript:   traced, frozen and passed through torch.jit.optimize_for_inference
+    - int8:          FX-mode static post-training quantisation calibrated on calib_batches,
+                     or on QUANT_CALIB_DIR images (startup fails if there are none)
+                     (dynamic quantisation only covers Linear layers, which this model no
+                     longer has once fc is replaced with Identity)
+
+    The input model is left untouched.
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}; expected one of {INFERENCE_BACKENDS}")
+    if backend == "eager":
+        return m
+
+    m = copy.deepcopy(m).eval()
+    example = torch.zeros(1, 3, *IMG_SIZE)
+    with torch.no_grad():
+        if backend == "channels_last":
+            return m.to(memory_format=torch.channels_last)
+
+        if backend == "torchscript":
+            traced = torch.jit.trace(m, example)
+            return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+        engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+        torch.backends.quantized.engine = engine
+        prepared = prepare_fx(m, get_default_qconfig_mapping(engine), example_inputs=(example,))
+        for xb in calib_batches or load_calibration_batches(
+            QUANT_CALIB_DIR, QUANT_CALIB_IMAGES, allow_random=QUANT_ALLOW_RANDOM_CALIB,
+        ):
+            prepared(xb)
+        return convert_fx(prepared)
+
+_base_resnet = build_resnet50(DEVICE)
+RESNET_PRETRAINED = getattr(_base_resnet, "_is_pretrained", False)
+resnet = optimize_for_inference(_base_resnet, INFERENCE_BACKEND)
+# Only eager serves straight from the mapping; the other backends build new tensors
+# (folded conv/bn, NHWC copies, int8 weights) in each worker's own heap
+RESNET_WEIGHTS_SHARED = getattr(_base_resnet, "_is_shared", False) and INFERENCE_BACKEND == "eager"
+if getattr(_base_resnet, "_is_shared", False) and not RESNET_WEIGHTS_SHARED:
+    logger.warning("INFERENCE_BACKEND=%s copies the ResNet weights into this worker; %s is only "
+                   "shared between workers with eager", INFERENCE_BACKEND, RESNET_SHARED_WEIGHTS)
+del _base_resnet
+INPUT_MEMORY_FORMAT = torch.channels_last if INFERENCE_BACKEND == "channels_last" else torch.contiguous_format
+
+# ---------------- EMBEDDING CACHE ----------------
+# Namespaced by the weights and backend in use so a model swap never serves stale embeddings
+EMB_CACHE_NAMESPACE = "resnet50:{}:{}:{}".format(
+    "pretrained" if RESNET_PRETRAINED else "random",
+    RESNET_SOURCE,
+    INFERENCE_BACKEND,
+)
+emb_cache: Optional[EmbeddingCache] = None
+if EMB_CACHE_ITEMS > 0 or EMB_CACHE_DIR:
+    emb_cache = EmbeddingCache(
+        EMB_DIM,
+        memory_items=EMB_CACHE_ITEMS,
+        disk_dir=EMB_CACHE_DIR or None,
+        disk_items=EMB_CACHE_DISK_ITEMS,
+        namespace=EMB_CACHE_NAMESPACE,
+    )
+phash_index: Optional[PerceptualIndex] = None
+if emb_cache is not None and EMB_CACHE_PHASH:
+    phash_index = PerceptualIndex(EMB_CACHE_PHASH_ITEMS)
 
 # ---------------- HELPERS ----------------
 def infer_from_filename(filename: str) -> Optional[str]:
@@ -100,21 +372,74 @@ def infer_from_filename(filename: str) -> Optional[str]:
         return "Negative"
     return None
 
-def extract_image_metadata(image_bytes: bytes) -> Dict[str, Any]:
-    meta: Dict[str, Any] = {"width": None, "height": None, "format": None, "exif": {}}
-    try:
-        img = Image.open(io.BytesIO(image_bytes))
-        meta["width"] = img.width
-        meta["height"] = img.height
-        meta["format"] = img.format
-    except Exception as e:
-        meta["error"] = f"Image open failed: {e}"
-        return meta
+class UploadData:
+    """
+    Upload contents either held in memory (small files) or spooled to a named temp file,
+    so large PDFs/images are opened by path and never copied into the Python heap.
+    """
+    def __init__(self, data: Optional[bytes] = None, path: Optional[str] = None):
+        self.data = data
+        self.path = path
+        self.size = len(data) if data is not None else os.path.getsize(path)
+
+    def open(self) -> BinaryIO:
+        return io.BytesIO(self.data) if self.data is not None else open(self.path, "rb")
+
+    def sha256(self) -> str:
+        if self.data is not None:
+            return hashlib.sha256(self.data).hexdigest()
+        h = hashlib.sha256()
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def close(self) -> None:
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+Source = Union[bytes, UploadData]
 
+def as_upload(src: Source) -> UploadData:
+    return src if isinstance(src, UploadData) else UploadData(data=src)
+
+def open_pdf(src: Source) -> "fitz.Document":
+    up = as_upload(src)
+    return fitz.open(up.path, filetype="pdf") if up.path is not None else fitz.open("pdf", up.data)
+
+async def read_upload(up: UploadFile) -> UploadData:
+    """
+    Small uploads are read into memory; larger ones are copied in chunks from the
+    multipart spool to a named temp file instead of being materialised as bytes.
+    """
+    f = up.file
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    if size <= UPLOAD_SPOOL_THRESHOLD:
+        return UploadData(data=await up.read())
+
+    def spool() -> str:
+        suffix = os.path.splitext(up.filename or "")[1]
+        with tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR, suffix=suffix, delete=False) as dst:
+            try:
+                shutil.copyfileobj(f, dst, 1024 * 1024)
+            except BaseException:
+                # No UploadData owns the file yet, so nothing else would remove it
+                dst.close()
+                os.unlink(dst.name)
+                raise
+            return dst.name
+
+    return UploadData(path=await asyncio.get_running_loop().run_in_executor(None, spool))
+
+def read_exif(fp: BinaryIO, meta: Dict[str, Any]) -> None:
     try:
-        bio = io.BytesIO(image_bytes)
-        bio.seek(0)
-        tags = exifread.process_file(bio, details=False)
+        fp.seek(0)
+        tags = exifread.process_file(fp, details=False)
         meta["exif"] = {
             tag: str(tags[tag])
             for tag in tags
@@ -123,11 +448,44 @@ def extract_image_metadata(image_bytes: bytes) -> Dict[str, Any]:
     except Exception as e:
         meta["exif_error"] = f"EXIF extraction failed: {e}"
 
+def extract_image_metadata(src: Source) -> Dict[str, Any]:
+    meta: Dict[str, Any] = {"width": None, "height": None, "format": None, "exif": {}}
+    with as_upload(src).open() as fp:
+        try:
+            img = Image.open(fp)
+            meta["width"] = img.width
+            meta["height"] = img.height
+            meta["format"] = img.format
+        except Exception as e:
+            meta["error"] = f"Image open failed: {e}"
+            return meta
+
+        read_exif(fp, meta)
     return meta
 
-def extract_pdf_metadata(pdf_bytes: bytes) -> Dict[str, Any]:
+def decode_image(src: Source, with_exif: bool = True) -> Tuple[Image.Image, Dict[str, Any]]:
+    """
+    Single-pass decode: header metadata, reduced-size pixels and EXIF all come from one
+    open handle. JPEGs are decoded by libjpeg at 1/2..1/8 scale via draft mode, and any
+    format is shrunk to at most DECODE_SIZE per side before the final 224x224 resize.
+    """
+    with as_upload(src).open() as fp:
+        img = Image.open(fp)
+        meta: Dict[str, Any] = {"width": img.width, "height": img.height, "format": img.format, "exif": {}}
+
+        img.draft("RGB", DECODE_SIZE)
+        img = img.convert("RGB")
+        w, h = img.size
+        target = (min(w, DECODE_SIZE[0]), min(h, DECODE_SIZE[1]))
+        if target != (w, h):
+            img = img.resize(target, Image.BILINEAR, reducing_gap=2.0)
+
+        if with_exif:
+            read_exif(fp, meta)
+    return img, meta
+
+def pdf_doc_metadata(doc: "fitz.Document") -> Dict[str, Any]:
     try:
-        doc = fitz.open("pdf", pdf_bytes)
         m = doc.metadata or {}
         return {
             "author": m.get("author"),
@@ -142,33 +500,440 @@ def extract_pdf_metadata(pdf_bytes: bytes) -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"PDF metadata extraction failed: {e}", "format": "PDF"}
 
-def pdf_first_page_to_image(pdf_bytes: bytes, dpi: int = 200) -> Image.Image:
+def extract_pdf_metadata(src: Source) -> Dict[str, Any]:
+    try:
+        doc = open_pdf(src)
+    except Exception as e:
+        return {"error": f"PDF metadata extraction failed: {e}", "format": "PDF"}
+    return pdf_doc_metadata(doc)
+
+def render_pdf_page(page: "fitz.Page", max_dpi: int = PDF_MAX_DPI) -> Image.Image:
+    """
+    Rasterise a page straight to about DECODE_SIZE and wrap the pixmap samples as an
+    RGB image, without the PNG encode/decode round-trip.
+    """
+    rect = page.rect
+    zoom = max(DECODE_SIZE[0] / rect.width, DECODE_SIZE[1] / rect.height)
+    zoom = min(zoom, max_dpi / 72.0)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+    # pix.samples is the one copy out of MuPDF; the image wraps it without another.
+    # (samples_mv would avoid even that, but only stays valid while pix is alive.)
+    return Image.frombuffer("RGB", (pix.width, pix.height), pix.samples, "raw", "RGB", pix.stride, 1)
+
+def decode_pdf(
+    src: Union[Source, "fitz.Document"],
+    max_pages: int = 1,
+    dpi: int = PDF_MAX_DPI,
+) -> Tuple[List[Image.Image], Dict[str, Any]]:
+    """
+    Render up to max_pages pages and read the document metadata from one open handle
+    (src itself when it is an already open document).
+    """
     try:
-        doc = fitz.open("pdf", pdf_bytes)
+        doc = src if isinstance(src, fitz.Document) else open_pdf(src)
         if len(doc) == 0:
             raise ValueError("PDF has no pages")
-        page = doc[0]
-        pix = page.get_pixmap(dpi=dpi)
-        img_bytes = pix.tobytes("png")
-        return Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        images = [render_pdf_page(page, dpi) for page in doc.pages(0, min(len(doc), max(1, max_pages)))]
     except Exception as e:
         raise RuntimeError(f"PDF to image conversion failed: {e}")
+    return images, pdf_doc_metadata(doc)
+
+def pdf_pages_to_images(src: Source, dpi: int = PDF_MAX_DPI, max_pages: int = 1) -> List[Image.Image]:
+    return decode_pdf(src, max_pages=max_pages, dpi=dpi)[0]
+
+def pdf_first_page_to_image(src: Source, dpi: int = PDF_MAX_DPI) -> Image.Image:
+    return pdf_pages_to_images(src, dpi=dpi, max_pages=1)[0]
+
+def extract_metadata(raw: Source, is_pdf: bool) -> Dict[str, Any]:
+    return extract_pdf_metadata(raw) if is_pdf else extract_image_metadata(raw)
+
+def prepare_inputs(
+    raw: Union[Source, "fitz.Document"],
+    is_pdf: bool,
+    all_pages: bool = False,
+    metadata: Optional[Dict[str, Any]] = None,
+    with_phash: bool = False,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[List[torch.Tensor], Dict[str, Any], List[Optional[Fingerprint]]]:
+    """
+    Decode an upload and transform it to model-ready tensors, one per PDF page (only the
+    first unless all_pages) or a single one for images. Also returns a perceptual
+    fingerprint per page when with_phash. Blocking; run in decode_executor.
+    """
+    t0 = time.perf_counter()
+    if is_pdf:
+        pil_imgs, decoded_meta = decode_pdf(raw, max_pages=PDF_MAX_PAGES if all_pages else 1)
+    else:
+        img, decoded_meta = decode_image(raw, with_exif=metadata is None)
+        pil_imgs = [img]
+    if metadata is None:
+        metadata = decoded_meta
+    fingerprints = [perceptual_fingerprint(img) if with_phash else None for img in pil_imgs]
+    t1 = time.perf_counter()
+    xs = [transform(img) for img in pil_imgs]
+    if timings is not None:
+        timings["decode"] = t1 - t0
+        timings["transform"] = time.perf_counter() - t1
+    return xs, metadata, fingerprints
+
+def lookup_or_prepare(
+    raw: Source,
+    is_pdf: bool,
+    all_pages: bool = False,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[str, Dict[str, Any], List[Optional[np.ndarray]], List[torch.Tensor], List[Optional[Fingerprint]]]:
+    """
+    Cache path of classify_upload as one decode_executor call: hash the bytes, look up
+    each page's content key, then either read just the headers (full hit) or decode,
+    taking the metadata from that same decode (miss). A PDF classified on all pages is
+    opened once; its page count picks the keys and the same handle is rendered. Pages
+    still missing are then matched against phash_index (re-encoded copies).
+    Returns (digest, metadata, cached embeddings per page, tensors, fingerprints).
+    """
+    t0 = time.perf_counter()
+    digest = as_upload(raw).sha256()
+    doc = None
+    n_pages = 1
+    if is_pdf and all_pages:
+        try:
+            doc = open_pdf(raw)
+            n_pages = min(doc.page_count, PDF_MAX_PAGES)
+        except Exception:
+            n_pages = 0    # prepare_inputs below reports the failure
+    cached = [emb_cache.get(content_key(digest, p if is_pdf else None)) for p in range(1, n_pages + 1)]
+    if timings is not None:
+        timings["hash"] = time.perf_counter() - t0
+
+    if cached and all(emb is not None for emb in cached):
+        metadata = pdf_doc_metadata(doc) if doc is not None else extract_metadata(raw, is_pdf)
+        return digest, metadata, cached, [], []
+    xs, metadata, fingerprints = prepare_inputs(
+        doc if doc is not None else raw, is_pdf, all_pages, None, phash_index is not None, timings,
+    )
+    cached = (cached + [None] * len(xs))[:len(xs)]
+    for i, fp in enumerate(fingerprints):
+        if cached[i] is None and fp is not None:
+            key = phash_index.find(fp)
+            cached[i] = emb_cache.get(key) if key else None
+    return digest, metadata, cached, xs, fingerprints
+
+def store_embeddings(
+    digest: str,
+    is_pdf: bool,
+    results: List["InferenceResult"],
+    fingerprints: List[Optional[Fingerprint]],
+) -> None:
+    """Cache each page's embedding under its content key (and fingerprint). Blocking."""
+    for page, (emb, _, _) in enumerate(results, start=1):
+        key = content_key(digest, page if is_pdf else None)
+        emb_cache.put(key, emb)
+        if phash_index is not None and page <= len(fingerprints) and fingerprints[page - 1] is not None:
+            phash_index.add(fingerprints[page - 1], key)
+
+def build_prediction(
+    filename: str,
+    is_pdf: bool,
+    metadata: Dict[str, Any],
+    ood_score: float,
+    probs: np.ndarray,
+    skip_ood: bool = False,
+) -> Dict[str, Any]:
+    # --- OOD gate ---
+    if not skip_ood:
+        if ood_score < OOD_SCORE_MIN:
+            return {
+                "file_based": infer_from_filename(filename),
+                "model_based": "Negative",
+                "label": "Negative",
+                "confidence": None,
+                "threshold": THRESH,
+                "metadata": metadata,
+                "type": "pdf" if is_pdf else "image",
+                "reason": "OOD",
+                "ood_score": ood_score,
+            }
+
+    # --- Classification with correct mapping ---
+    class_ids = clf.classes_                         # e.g., array([0,2,3])
+    id_to_name = {int(i): classes[int(i)] for i in class_ids}
+
+    best_col = int(np.argmax(probs))
+    best_class_id = int(class_ids[best_col])
+    pred_label = id_to_name[best_class_id]
+    max_prob = float(probs[best_col])
+
+    # Threshold to Negative if low confidence
+    final_label = pred_label if max_prob >= THRESH else "Negative"
+    confidence_pct = f"{max_prob * 100.0:.2f}%"
+
+    # Optional: per-class probs in ID space
+    probs_dict = {id_to_name[int(i)]: float(p) for i, p in zip(class_ids, probs)}
+
+    return {
+        "file_based": infer_from_filename(filename),
+        "model_based": pred_label,
+        "label": final_label,
+        "confidence": confidence_pct,
+        "threshold": THRESH,
+        "metadata": metadata,
+        "type": "pdf" if is_pdf else "image",
+        "ood_score": ood_score,
+        "probs": probs_dict,
+    }
+
+# ---------------- BATCHED INFERENCE ----------------
+InferenceResult = Tuple[np.ndarray, float, np.ndarray]   # (embedding, ood_score, probs)
+
+BatchItem = Tuple[Optional[torch.Tensor], Optional[np.ndarray]]   # (input tensor, cached embedding)
+
+def run_inference(items: List[BatchItem], timings: Optional[Dict[str, float]] = None) -> List[InferenceResult]:
+    """
+    Embed every item without a cached embedding in one ResNet50 forward pass, then score
+    all embeddings with a single OOD and a single classifier call. Per-stage durations
+    of the whole batch go into timings when given.
+    """
+    t0 = time.perf_counter()
+    embs = np.empty((len(items), EMB_DIM), dtype=np.float32)
+    todo = [i for i, (_, emb) in enumerate(items) if emb is None]
+    for i, (_, emb) in enumerate(items):
+        if emb is not None:
+            embs[i] = emb
+    if todo:
+        xb = torch.stack([items[i][0] for i in todo]).to(DEVICE, memory_format=INPUT_MEMORY_FORMAT)
+        with torch.no_grad():
+            embs[todo] = resnet(xb).cpu().numpy()
+    t1 = time.perf_counter()
+    ood_scores = ood_scorer.decision_function(embs)  # higher is more in-distribution
+    t2 = time.perf_counter()
+    probs = clf.predict_proba(embs)                  # (N, K)
+    if timings is not None:
+        timings.update(embed=t1 - t0, ood=t2 - t1, classify=time.perf_counter() - t2)
+    return [(embs[i], float(ood_scores[i]), probs[i]) for i in range(len(embs))]
+
+class MicroBatcher:
+    """
+    Fuses concurrent requests into one run_inference call. A batch is flushed as soon
+    as it holds max_batch_size inputs or the first input has waited max_wait_ms.
+    """
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(
+        self,
+        x: Optional[torch.Tensor] = None,
+        emb: Optional[np.ndarray] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> InferenceResult:
+        """
+        Queue an input tensor, or an already known embedding that only needs scoring.
+        timings receives the stage durations of the batch this input ran in.
+        """
+        if self._queue is None:
+            raise RuntimeError("MicroBatcher is not running")
+        if x is None and emb is None:
+            raise ValueError("submit() needs an input tensor or an embedding")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(((x, emb), fut, timings))
+        return await fut
+
+    async def _collect(self) -> List[Tuple[BatchItem, asyncio.Future, Optional[Dict[str, float]]]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            try:
+                if timeout <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [entry for entry in await self._collect() if not entry[1].cancelled()]
+            if not batch:
+                continue
+            batch_timings: Dict[str, float] = {}
+            try:
+                items = [item for item, _, _ in batch]
+                results = await loop.run_in_executor(inference_executor, run_inference, items, batch_timings)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut, timings), res in zip(batch, results):
+                if timings is not None:
+                    timings.update(batch_timings)
+                if not fut.done():
+                    fut.set_result(res)
+
+class AdmissionQueue:
+    """
+    Counts requests inside the decode/inference pipeline and refuses new ones beyond
+    max_depth. Only touched from the event loop, so no locking is needed.
+    """
+    def __init__(self, max_depth: int):
+        self.max_depth = max(1, max_depth)
+        self.depth = 0
+
+    def try_acquire(self, n: int = 1) -> bool:
+        if self.depth + n > self.max_depth:
+            return False
+        self.depth += n
+        return True
+
+    def release(self, n: int = 1) -> None:
+        self.depth = max(0, self.depth - n)
+
+batcher = MicroBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+admission = AdmissionQueue(MAX_QUEUE_DEPTH)
+
+def is_pdf_upload(up: UploadFile) -> bool:
+    return (up.filename or "").lower().endswith(".pdf") or (getattr(up, "content_type", "") == "application/pdf")
+
+def overloaded_response() -> JSONResponse:
+    return JSONResponse(
+        {"error": "Server busy, retry later", "queue_depth": admission.depth},
+        status_code=503,
+        headers={"Retry-After": str(RETRY_AFTER_S)},
+    )
+
+async def classify_upload(
+    raw: Source,
+    is_pdf: bool,
+    all_pages: bool = False,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[Dict[str, Any], List[InferenceResult]]:
+    """
+    Score every page of an upload, reusing cached embeddings where possible: first by
+    SHA-256 of the bytes (no decode at all), then by perceptual fingerprint after
+    decoding (re-encoded copies, only with EMB_CACHE_PHASH).
+    Stage durations (decode, transform, embed, ood, classify, ...) go into timings.
+    """
+    loop = asyncio.get_running_loop()
+    if emb_cache is None:
+        xs, metadata, _ = await loop.run_in_executor(
+            decode_executor, prepare_inputs, raw, is_pdf, all_pages, None, False, timings,
+        )
+        return metadata, list(await asyncio.gather(*(batcher.submit(x, None, timings) for x in xs)))
+
+    digest, metadata, cached, xs, fingerprints = await loop.run_in_executor(
+        decode_executor, lookup_or_prepare, raw, is_pdf, all_pages, timings,
+    )
+    if not xs:
+        items: List[BatchItem] = [(None, emb) for emb in cached]
+    else:
+        items = [(None, emb) if emb is not None else (x, None) for x, emb in zip(xs, cached)]
+
+    # Every page is submitted at once so they share forward passes with other requests
+    results = list(await asyncio.gather(*(batcher.submit(x, emb, timings) for x, emb in items)))
+
+    # Disk-tier writes and the cache lock stay off the event loop
+    await loop.run_in_executor(decode_executor, store_embeddings, digest, is_pdf, results, fingerprints)
+    return metadata, results
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Stage durations as a Server-Timing header value (milliseconds)."""
+    return ", ".join(f"{name};dur={sec * 1000.0:.2f}" for name, sec in timings.items())
 
 # ---------------- FASTAPI APP ----------------
 app = FastAPI(title="ID Card Classifier API", version="1.0")
 
+# Liveness is "the process answers"; readiness additionally needs a successful warm-up
+readiness: Dict[str, Any] = {"ready": False, "error": None}
+
+async def warm_up() -> None:
+    """
+    Push dummy inputs through the batcher (single and full-batch) so lazy torch/oneDNN
+    initialisation and first-touch page faults on mapped weights happen before traffic.
+    """
+    try:
+        x = torch.zeros(3, *IMG_SIZE)
+        for _ in range(max(1, WARMUP_ITERS)):
+            await batcher.submit(x)
+            await asyncio.gather(*(batcher.submit(x) for _ in range(batcher.max_batch_size)))
+        readiness["ready"] = True
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.exception("Warm-up failed")
+
+@app.on_event("startup")
+async def start_batcher():
+    batcher.start()
+    # Awaited, not backgrounded: uvicorn only accepts connections on a worker once startup
+    # has finished, so no worker serves /predict cold. A failed warm-up is logged and
+    # reported by /health/ready instead of aborting startup.
+    await warm_up()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+    if emb_cache is not None:
+        emb_cache.close()
+    decode_executor.shutdown(wait=False, cancel_futures=True)
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+
 @app.get("/health")
 async def health():
     return JSONResponse({
         "status": "ok",
+        "ready": readiness["ready"],
         "device": str(DEVICE),
         "classes": classes,
         "threshold": THRESH,
         "ood_score_min": OOD_SCORE_MIN,
-        "resnet_pretrained": getattr(resnet, "_is_pretrained", False),
+        "resnet_pretrained": RESNET_PRETRAINED,
+        "resnet_weights_shared": RESNET_WEIGHTS_SHARED,
+        "inference_backend": INFERENCE_BACKEND,
+        "ood_scorer": ood_scorer.report,
         "clf_classes_": [int(i) for i in clf.classes_.tolist()],  # e.g. [0,2,3]
+        "batch_max_size": batcher.max_batch_size,
+        "batch_max_wait_ms": BATCH_MAX_WAIT_MS,
+        "torch_threads": infer_threads["intra_op"],
+        "queue_depth": admission.depth,
+        "queue_max_depth": admission.max_depth,
+        "batch_pending": batcher.pending,
+        "embedding_cache": emb_cache.stats() if emb_cache is not None else None,
     })
 
+@app.get("/health/live")
+async def health_live():
+    return JSONResponse({"status": "alive"})
+
+@app.get("/health/ready")
+async def health_ready():
+    if not readiness["ready"]:
+        return JSONResponse(
+            {"status": "warming_up" if readiness["error"] is None else "failed", "error": readiness["error"]},
+            status_code=503,
+        )
+    return JSONResponse({"status": "ready"})
+
 @app.post("/predict")
 async def predict(
     request: Request,
@@ -180,76 +945,92 @@ async def predict(
     if up is None:
         return JSONResponse({"error": "No file provided (use form field 'image' or 'file')"}, status_code=400)
 
+    if not admission.try_acquire():
+        return overloaded_response()
+
     filename = (up.filename or "").lower()
+    raw: Optional[UploadData] = None
     try:
-        raw = await up.read()
-        if not raw:
+        raw = await read_upload(up)
+        if not raw.size:
             return JSONResponse({"error": "Empty file"}, status_code=400)
 
-        is_pdf = filename.endswith(".pdf") or (getattr(up, "content_type", "") == "application/pdf")
-        if is_pdf:
-            pil_img = pdf_first_page_to_image(raw)
-            metadata = extract_pdf_metadata(raw)
-        else:
-            pil_img = Image.open(io.BytesIO(raw)).convert("RGB")
-            metadata = extract_image_metadata(raw)
-
-        x = transform(pil_img).unsqueeze(0).to(DEVICE)
+        is_pdf = is_pdf_upload(up)
+        # Batched with whatever other requests are in flight
+        timings: Dict[str, float] = {}
+        metadata, results = await classify_upload(raw, is_pdf, timings=timings)
+        _, ood_score, probs = results[0]
 
-        with torch.no_grad():
-            emb = resnet(x).cpu().numpy()[0]
-
-        # --- OOD gate ---
-        ood_score = float(ocsvm.decision_function([emb])[0])  # higher is more in-distribution
-        if not skip_ood:
-            if ood_score < OOD_SCORE_MIN:
-                return JSONResponse({
-                    "file_based": infer_from_filename(filename),
-                    "model_based": "Negative",
-                    "label": "Negative",
-                    "confidence": None,
-                    "threshold": THRESH,
-                    "metadata": metadata,
-                    "type": "pdf" if is_pdf else "image",
-                    "reason": "OOD",
-                    "ood_score": ood_score,
-                })
-
-        # --- Classification with correct mapping ---
-        probs = clf.predict_proba([emb])[0]              # (K,)
-        class_ids = clf.classes_                         # e.g., array([0,2,3])
-        id_to_name = {int(i): classes[int(i)] for i in class_ids}
-
-        best_col = int(np.argmax(probs))
-        best_class_id = int(class_ids[best_col])
-        pred_label = id_to_name[best_class_id]
-        max_prob = float(probs[best_col])
-
-        # Threshold to Negative if low confidence
-        final_label = pred_label if max_prob >= THRESH else "Negative"
-        confidence_pct = f"{max_prob * 100.0:.2f}%"
-
-        # Optional: per-class probs in ID space
-        probs_dict = {id_to_name[int(i)]: float(p) for i, p in zip(class_ids, probs)}
-
-        return JSONResponse({
-            "file_based": infer_from_filename(filename),
-            "model_based": pred_label,
-            "label": final_label,
-            "confidence": confidence_pct,
-            "threshold": THRESH,
-            "metadata": metadata,
-            "type": "pdf" if is_pdf else "image",
-            "ood_score": ood_score,
-            "probs": probs_dict,
-        })
+        return JSONResponse(
+            build_prediction(filename, is_pdf, metadata, ood_score, probs, skip_ood),
+            headers={"Server-Timing": server_timing(timings)},
+        )
 
     except Exception as e:
         return JSONResponse({"error": "Prediction failed", "details": str(e)}, status_code=500)
+    finally:
+        if raw is not None:
+            raw.close()
+        admission.release()
+
+async def predict_upload(up: UploadFile, all_pages: bool, skip_ood: bool) -> List[Dict[str, Any]]:
+    """One /predict-batch entry: a /predict-shaped result per image or per PDF page."""
+    filename = (up.filename or "").lower()
+    raw: Optional[UploadData] = None
+    try:
+        raw = await read_upload(up)
+        if not raw.size:
+            return [{"file_name": up.filename, "error": "Empty file"}]
+
+        is_pdf = is_pdf_upload(up)
+        metadata, outputs = await classify_upload(raw, is_pdf, all_pages)
+
+        results = []
+        for page, (_, ood_score, probs) in enumerate(outputs, start=1):
+            res = {"file_name": up.filename}
+            if is_pdf:
+                res["page"] = page
+            res.update(build_prediction(filename, is_pdf, metadata, ood_score, probs, skip_ood))
+            results.append(res)
+        return results
+
+    except Exception as e:
+        return [{"file_name": up.filename, "error": "Prediction failed", "details": str(e)}]
+    finally:
+        if raw is not None:
+            raw.close()
+
+@app.post("/predict-batch")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    all_pages: bool = Query(False, description="Classify every PDF page (up to PDF_MAX_PAGES), not just the first"),
+    skip_ood: bool = Query(False, description="Set true to bypass OOD for debugging"),
+):
+    if not files:
+        return JSONResponse({"error": "No files provided (use form field 'files')"}, status_code=400)
+    if len(files) > BATCH_MAX_FILES:
+        return JSONResponse({"error": f"Too many files (max {BATCH_MAX_FILES})"}, status_code=400)
+
+    # Admission counts forward-pass inputs: an all-pages PDF may expand to PDF_MAX_PAGES
+    slots = sum(PDF_MAX_PAGES if all_pages and is_pdf_upload(up) else 1 for up in files)
+    if slots > admission.max_depth:
+        return JSONResponse(
+            {"error": f"Batch too large: needs {slots} queue slots, max {admission.max_depth}"},
+            status_code=400,
+        )
+    if not admission.try_acquire(slots):
+        return overloaded_response()
+
+    try:
+        # Files are decoded concurrently in decode_executor and embedded together by the batcher
+        per_file = await asyncio.gather(*(predict_upload(up, all_pages, skip_ood) for up in files))
+        return JSONResponse({"results": [res for results in per_file for res in results]})
+    finally:
+        admission.release(slots)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("api:app", host="0.0.0.0", port=6000, reload=True)
+    uvicorn.run("api:app", host="0.0.0.0", port=6000, reload=True)    # dev only; see model_server.py for prod
 
 # # ---------------------------------------------------------------------------------------------------------------------------
 #                                     #                       Flask API
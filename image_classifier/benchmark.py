@@ -0,0 +1,305 @@
+# benchmark.py
+"""
+Load-test and latency benchmark for the image classifier.
+
+Generates synthetic ID-card-like inputs (JPEG/PNG/WEBP/AVIF at several sizes and
+multi-page PDFs) and drives /predict (or, with --endpoints batch-all-pages,
+/predict-batch?all_pages=true so every PDF page is embedded) at the requested
+concurrency levels. Reports req/s and p50/p95/p99 latency over successful responses
+only, with shed/failed requests counted separately, plus the per-stage breakdown from
+the Server-Timing header (decode, transform, embed, ood, classify).
+
+In-process (default) the FastAPI app is imported and called through httpx's ASGI
+transport, which also allows sweeping torch threads and micro-batch size:
+
+    python benchmark.py --concurrency 1 4 16 --threads 2 4 --batch-sizes 1 8 16
+
+Over HTTP against a running server (its own config applies):
+
+    python benchmark.py --url http://localhost:6000 --concurrency 1 8 32
+
+When the sklearn artifacts are missing from MODELS_DIR (or with --stub-models), small
+stub models are fitted on random embeddings so the pipeline can still be timed.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Dict, List, Tuple, Any, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+try:
+    import pillow_avif  # noqa: F401  registers the AVIF plugin on older Pillow
+except ImportError:
+    pass
+
+import httpx
+
+STAGES = ("hash", "decode", "transform", "embed", "ood", "classify")
+DEFAULT_INPUTS = ["jpeg-640x400", "jpeg-4000x3000", "png-1600x1000", "webp-1600x1000", "avif-1600x1000", "pdf-3p"]
+CONTENT_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp", "avif": "image/avif",
+                 "pdf": "application/pdf"}
+
+# ---------------- SYNTHETIC INPUTS ----------------
+def synthetic_card(width: int, height: int, rng: random.Random) -> Image.Image:
+    """Card-like layout: tinted background, photo box, text lines and a little noise."""
+    bg = tuple(rng.randint(180, 250) for _ in range(3))
+    img = Image.new("RGB", (width, height), bg)
+    draw = ImageDraw.Draw(img)
+    s = min(width, height)
+    draw.rectangle([0, 0, width, int(height * 0.15)], fill=tuple(rng.randint(20, 120) for _ in range(3)))
+    draw.rectangle([int(s * 0.05), int(height * 0.25), int(s * 0.05) + int(s * 0.3), int(height * 0.25) + int(s * 0.38)],
+                   fill=(120, 120, 130), outline=(40, 40, 40), width=max(1, s // 200))
+    x0 = int(s * 0.05) + int(s * 0.36)
+    for i in range(6):
+        y = int(height * 0.28) + i * int(height * 0.09)
+        draw.rectangle([x0, y, x0 + int((width - x0) * rng.uniform(0.4, 0.9)), y + max(2, height // 40)],
+                       fill=(30, 30, 30))
+    noise = np.random.default_rng(rng.randint(0, 2**31)).integers(0, 24, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(np.clip(np.asarray(img, dtype=np.int16) - noise, 0, 255).astype(np.uint8))
+
+def encode_image(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    pil_fmt = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP", "avif": "AVIF"}[fmt]
+    kwargs = {"quality": 85} if fmt in ("jpeg", "webp", "avif") else {}
+    img.save(buf, format=pil_fmt, **kwargs)
+    return buf.getvalue()
+
+def synthetic_pdf(pages: int, rng: random.Random) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)   # A4 in points
+        card = encode_image(synthetic_card(1200, 760, rng), "jpeg")
+        page.insert_image(fitz.Rect(60, 80, 535, 380), stream=card)
+        page.insert_text((60, 440), "Synthetic benchmark page", fontsize=14)
+    return doc.tobytes()
+
+def build_inputs(spec: str, variants: int, seed: int) -> List[Tuple[str, bytes, str]]:
+    """
+    `variants` distinct payloads for a spec such as "jpeg-1600x1000" or "pdf-3p", as
+    (filename, bytes, content_type). Distinct bytes keep the embedding cache honest.
+    """
+    kind, _, size = spec.partition("-")
+    rng = random.Random(f"{seed}:{spec}")
+    out = []
+    for i in range(variants):
+        if kind == "pdf":
+            pages = int(size.rstrip("p") or 1)
+            data = synthetic_pdf(pages, rng)
+            out.append((f"bench_{i}.pdf", data, CONTENT_TYPES["pdf"]))
+        else:
+            w, h = (int(v) for v in size.split("x"))
+            data = encode_image(synthetic_card(w, h, rng), kind)
+            out.append((f"bench_{i}.{'jpg' if kind == 'jpeg' else kind}", data, CONTENT_TYPES[kind]))
+    return out
+
+# ---------------- STUB MODELS ----------------
+def write_stub_models(models_dir: str, dim: int = 2048, seed: int = 0) -> None:
+    """Tiny LogisticRegression / OneClassSVM on random embeddings, same shapes as the real ones."""
+    import joblib
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import OneClassSVM
+
+    rng = np.random.default_rng(seed)
+    X = np.abs(rng.normal(0.4, 0.3, (400, dim))).astype(np.float32)   # post-ReLU-like features
+    y = rng.integers(0, 4, len(X))
+    os.makedirs(models_dir, exist_ok=True)
+    joblib.dump(LogisticRegression(max_iter=200).fit(X, y), os.path.join(models_dir, "id_classifier.pkl"))
+    joblib.dump(OneClassSVM(gamma="scale", nu=0.1).fit(X), os.path.join(models_dir, "ood_detector.pkl"))
+    joblib.dump(["Pan card", "aadhaar", "negative", "passport"], os.path.join(models_dir, "classes.pkl"))
+
+def models_present(models_dir: str) -> bool:
+    return all(os.path.isfile(os.path.join(models_dir, n))
+               for n in ("id_classifier.pkl", "ood_detector.pkl", "classes.pkl"))
+
+# ---------------- LOAD GENERATION ----------------
+def parse_server_timing(value: str) -> Dict[str, float]:
+    stages = {}
+    for part in value.split(","):
+        name, _, rest = part.strip().partition(";")
+        if rest.startswith("dur="):
+            try:
+                stages[name] = float(rest[4:])
+            except ValueError:
+                pass
+    return stages
+
+ENDPOINTS = ("predict", "batch-all-pages")
+
+async def post(client: httpx.AsyncClient, endpoint: str, payload: Tuple[str, bytes, str]) -> httpx.Response:
+    """predict: one file to /predict (first PDF page only); batch-all-pages: /predict-batch?all_pages=true."""
+    if endpoint == "batch-all-pages":
+        return await client.post("/predict-batch", params={"all_pages": "true"}, files=[("files", payload)])
+    return await client.post("/predict", files={"image": payload})
+
+async def run_level(
+    client: httpx.AsyncClient,
+    payloads: List[Tuple[str, bytes, str]],
+    concurrency: int,
+    total: int,
+    endpoint: str = "predict",
+) -> Dict[str, Any]:
+    """
+    Throughput and latency percentiles count successful (200) responses only; shed (503)
+    or failed requests return quickly and would otherwise flatter both. They are
+    reported separately in "statuses".
+    """
+    latencies: List[float] = []
+    stage_ms: Dict[str, List[float]] = {s: [] for s in STAGES}
+    statuses: Dict[int, int] = {}
+    pages = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal pages
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                resp = await post(client, endpoint, payloads[i % len(payloads)])
+                code = resp.status_code
+            except httpx.HTTPError:
+                code = -1
+                resp = None
+            elapsed = (time.perf_counter() - start) * 1000.0
+            statuses[code] = statuses.get(code, 0) + 1
+            if resp is None or code != 200:
+                continue
+            latencies.append(elapsed)
+            pages += 1 if endpoint == "predict" else len(resp.json()["results"])
+            for stage, ms in parse_server_timing(resp.headers.get("server-timing", "")).items():
+                stage_ms.setdefault(stage, []).append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    lat = np.asarray(latencies) if latencies else np.asarray([np.nan])
+    ok = statuses.get(200, 0)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "statuses": statuses,
+        "req_per_s": ok / wall if wall else 0.0,
+        "pages_per_s": pages / wall if wall else 0.0,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "stages_ms": {s: float(np.mean(v)) for s, v in stage_ms.items() if v},
+    }
+
+def print_row(label: str, r: Dict[str, Any]) -> None:
+    stages = " ".join(f"{s}={r['stages_ms'][s]:.1f}" for s in STAGES if s in r["stages_ms"])
+    errors = r["requests"] - r["ok"]
+    if r["endpoint"] != "predict":
+        label = f"{label} [{r['endpoint']}]"
+        stages = f"pages/s={r['pages_per_s']:.1f} {stages}"
+    if errors:
+        stages += "  errors: " + " ".join(f"{code}x{n}" for code, n in sorted(r["statuses"].items()) if code != 200)
+    print(f"{label:<38}{r['concurrency']:>5}{r['req_per_s']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+          f"{r['p99_ms']:>9.1f}{errors:>6}  {stages}")
+
+# ---------------- MAIN ----------------
+async def bench(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    inputs = {spec: build_inputs(spec, args.variants, args.seed) for spec in args.inputs}
+    results: List[Dict[str, Any]] = []
+
+    print(f"{'input / config':<38}{'conc':>5}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}  stage means (ms)")
+    print("-" * 110)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            for endpoint in args.endpoints:
+                for spec, payloads in inputs.items():
+                    for conc in args.concurrency:
+                        r = await run_level(client, payloads, conc, args.requests, endpoint)
+                        r.update(input=spec, mode="http")
+                        print_row(spec, r)
+                        results.append(r)
+        return results
+
+    import api
+
+    await api.start_batcher()
+    while not api.readiness["ready"]:
+        if api.readiness["error"]:
+            raise RuntimeError(f"warm-up failed: {api.readiness['error']}")
+        await asyncio.sleep(0.05)
+
+    # Thread settings must be applied on the thread that runs the model, not the event loop
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(api.inference_executor, api.set_inference_threads, 0)
+    default_threads = api.infer_threads["intra_op"]
+    transport = httpx.ASGITransport(app=api.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            for threads in args.threads or [default_threads]:
+                await loop.run_in_executor(api.inference_executor, api.set_inference_threads, threads)
+                for bs in args.batch_sizes or [api.batcher.max_batch_size]:
+                    api.batcher.max_batch_size = bs
+                    for endpoint in args.endpoints:
+                        for spec, payloads in inputs.items():
+                            for conc in args.concurrency:
+                                r = await run_level(client, payloads, conc, args.requests, endpoint)
+                                r.update(input=spec, mode="inprocess", threads=threads, batch_size=bs)
+                                print_row(f"{spec} t={threads} bs={bs}", r)
+                                results.append(r)
+    finally:
+        await api.stop_batcher()
+    return results
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="benchmark a running server over HTTP instead of in-process")
+    ap.add_argument("--inputs", nargs="+", default=DEFAULT_INPUTS,
+                    help="input specs: <jpeg|png|webp|avif>-<W>x<H> or pdf-<N>p")
+    ap.add_argument("--endpoints", nargs="+", default=["predict"], choices=ENDPOINTS,
+                    help="predict: /predict (first PDF page only); batch-all-pages: /predict-batch?all_pages=true")
+    ap.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    ap.add_argument("--requests", type=int, default=64, help="requests per (input, concurrency) level")
+    ap.add_argument("--variants", type=int, default=8, help="distinct payloads generated per input spec")
+    ap.add_argument("--threads", nargs="+", type=int, help="in-process: torch thread counts to sweep")
+    ap.add_argument("--batch-sizes", nargs="+", type=int, help="in-process: micro-batch sizes to sweep")
+    ap.add_argument("--stub-models", action="store_true", help="in-process: always use stub sklearn models")
+    ap.add_argument("--with-cache", action="store_true", help="in-process: keep the embedding cache enabled")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="also write the results to this file")
+    args = ap.parse_args()
+
+    Image.init()   # Image.SAVE is only complete once every plugin has registered
+    if "avif" in " ".join(args.inputs) and "AVIF" not in Image.SAVE:
+        print("AVIF encoder unavailable (install pillow-avif-plugin); skipping avif inputs", file=sys.stderr)
+        args.inputs = [s for s in args.inputs if not s.startswith("avif")]
+
+    if not args.url:
+        # Must be settled before api is imported
+        os.environ.setdefault("QUANT_ALLOW_RANDOM_CALIB", "true")   # int8 runs need no calibration set
+        if not args.with_cache:
+            os.environ["EMB_CACHE_ITEMS"] = "0"
+            os.environ["EMB_CACHE_DIR"] = ""
+        models_dir = os.getenv("MODELS_DIR", "models")
+        if args.stub_models or not models_present(models_dir):
+            stub_dir = tempfile.mkdtemp(prefix="bench_models_")
+            print(f"Using stub sklearn models in {stub_dir}", file=sys.stderr)
+            write_stub_models(stub_dir, seed=args.seed)
+            os.environ["MODELS_DIR"] = stub_dir
+
+    results = asyncio.run(bench(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
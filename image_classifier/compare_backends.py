@@ -0,0 +1,142 @@
+# compare_backends.py
+"""
+Offline accuracy check for the optimised inference backends.
+
+Embeds a local image set with the eager FP32 model and with each candidate backend,
+then reports how far the embeddings drift and how often the OOD gate and final label
+(as returned by /predict) disagree with FP32.
+
+int8 is calibrated as in serving, on QUANT_CALIB_DIR, when that is set. Otherwise every
+--calib-every'th file of image_dir is held out for calibration and not scored, so the
+reported accuracy is never measured on the calibration images.
+
+    python compare_backends.py path/to/images --backends torchscript channels_last int8
+"""
+import os
+import sys
+import time
+import argparse
+from typing import List, Tuple
+
+# FP32 reference is built by importing api, so keep that import cheap and side-effect free
+os.environ["INFERENCE_BACKEND"] = "eager"
+os.environ["EMB_CACHE_ITEMS"] = "0"
+os.environ["EMB_CACHE_DIR"] = ""
+
+import numpy as np
+import torch
+
+import api
+
+def load_images(image_dir: str, limit: int) -> Tuple[List[str], List[torch.Tensor]]:
+    names, tensors = [], []
+    for name in sorted(os.listdir(image_dir)):
+        if len(names) >= limit:
+            break
+        path = os.path.join(image_dir, name)
+        lower = name.lower()
+        try:
+            if lower.endswith(".pdf"):
+                with open(path, "rb") as f:
+                    img = api.pdf_first_page_to_image(f.read())
+            elif lower.endswith(api.IMAGE_EXTS):
+                with open(path, "rb") as f:
+                    img, _ = api.decode_image(f.read(), with_exif=False)
+            else:
+                continue
+        except Exception as e:
+            print(f"skip {name}: {e}", file=sys.stderr)
+            continue
+        names.append(name)
+        tensors.append(api.transform(img))
+    return names, tensors
+
+def embed(model: torch.nn.Module, tensors: List[torch.Tensor], batch_size: int, channels_last: bool) -> Tuple[np.ndarray, float]:
+    fmt = torch.channels_last if channels_last else torch.contiguous_format
+    out = []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for i in range(0, len(tensors), batch_size):
+            xb = torch.stack(tensors[i:i + batch_size]).contiguous(memory_format=fmt)
+            out.append(model(xb).cpu().numpy())
+    elapsed = time.perf_counter() - start
+    return np.concatenate(out).astype(np.float32), elapsed / max(1, len(tensors))
+
+def score(names: List[str], embs: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    ood = api.ocsvm.decision_function(embs)
+    probs = api.clf.predict_proba(embs)
+    labels = [
+        api.build_prediction(name, False, {}, float(o), p)["label"]
+        for name, o, p in zip(names, ood, probs)
+    ]
+    return ood, labels
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("image_dir", help="directory of images/PDFs to compare on")
+    ap.add_argument("--backends", nargs="+", default=[b for b in api.INFERENCE_BACKENDS if b != "eager"],
+                    choices=api.INFERENCE_BACKENDS)
+    ap.add_argument("--limit", type=int, default=500, help="max files to load")
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--calib-every", type=int, default=4,
+                    help="without QUANT_CALIB_DIR: hold out every N-th file of image_dir for int8 calibration")
+    args = ap.parse_args()
+
+    names, tensors = load_images(args.image_dir, args.limit)
+    if not names:
+        print(f"No images found in {args.image_dir}", file=sys.stderr)
+        return 1
+
+    # int8 is never scored on its own calibration images
+    calib, calib_source = None, ""
+    if "int8" in args.backends and api.QUANT_CALIB_DIR:
+        calib = api.load_calibration_batches(api.QUANT_CALIB_DIR, api.QUANT_CALIB_IMAGES)
+        calib_source = f"QUANT_CALIB_DIR={api.QUANT_CALIB_DIR}"
+    elif "int8" in args.backends:
+        every = max(2, args.calib_every)
+        held = [t for i, t in enumerate(tensors) if i % every == 0][:api.QUANT_CALIB_IMAGES]
+        names = [n for i, n in enumerate(names) if i % every]
+        tensors = [t for i, t in enumerate(tensors) if i % every]
+        if not names or not held:
+            print(f"Need at least 2 files in {args.image_dir} to split calibration from evaluation", file=sys.stderr)
+            return 1
+        calib = [torch.stack(held[i:i + 8]) for i in range(0, len(held), 8)]
+        calib_source = f"{len(held)} held-out files of {args.image_dir} (every {every}th)"
+
+    ref_embs, ref_ms = embed(api.resnet, tensors, args.batch_size, channels_last=False)
+    ref_ood, ref_labels = score(names, ref_embs)
+    ref_in = ref_ood >= api.OOD_SCORE_MIN
+
+    print(f"{len(names)} files, FP32 eager: {ref_ms * 1000:.1f} ms/image")
+    if calib_source:
+        print(f"int8 calibration: {calib_source}")
+    print()
+    header = f"{'backend':<14}{'ms/img':>8}{'speedup':>9}{'cos min':>9}{'cos mean':>10}{'max |Δemb|':>12}" \
+             f"{'max |Δood|':>12}{'ood agree':>11}{'label agree':>13}"
+    print(header)
+    print("-" * len(header))
+
+    for backend in args.backends:
+        model = api.optimize_for_inference(api.resnet, backend, calib_batches=calib)
+        embs, ms = embed(model, tensors, args.batch_size, channels_last=(backend == "channels_last"))
+        ood, labels = score(names, embs)
+
+        cos = np.sum(embs * ref_embs, axis=1) / (
+            np.linalg.norm(embs, axis=1) * np.linalg.norm(ref_embs, axis=1) + 1e-12
+        )
+        ood_agree = float(np.mean((ood >= api.OOD_SCORE_MIN) == ref_in))
+        label_agree = float(np.mean([a == b for a, b in zip(labels, ref_labels)]))
+        print(f"{backend:<14}{ms * 1000:>8.1f}{ref_ms / ms:>8.2f}x{cos.min():>9.4f}{cos.mean():>10.4f}"
+              f"{np.abs(embs - ref_embs).max():>12.4f}{np.abs(ood - ref_ood).max():>12.4f}"
+              f"{ood_agree:>10.1%}{label_agree:>13.1%}")
+
+        mismatches = [(n, a, b) for n, a, b in zip(names, ref_labels, labels) if a != b]
+        for n, a, b in mismatches[:10]:
+            print(f"    {n}: fp32={a} {backend}={b}")
+        if len(mismatches) > 10:
+            print(f"    ... {len(mismatches) - 10} more")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# embedding_cache.py
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+# ---------------- KEYS ----------------
+def content_key(digest: str, page: Optional[int] = None) -> str:
+    """Exact-bytes key; PDF pages get their own entry under the same file digest."""
+    return f"sha256:{digest}" if page is None else f"sha256:{digest}:p{page}"
+
+# Perceptual matching: a 256-bit difference hash finds candidates, then a grayscale
+# thumbnail has to match pixel by pixel. dHash alone cannot tell apart two cards that
+# differ only in their text (a changed digit flips no bits at 9x8).
+PHASH_SIZE = 16        # 16x16 comparisons = 256 bits
+PHASH_MIN_BITS = 16    # fewer set (or cleared) bits = near-uniform image, never indexed
+THUMB_SIZE = 128
+
+Fingerprint = Tuple[np.ndarray, np.ndarray]   # (packed dHash bits, THUMB_SIZE^2 uint8 thumbnail)
+
+def perceptual_fingerprint(img: Image.Image) -> Optional[Fingerprint]:
+    """
+    Fingerprint of a decoded image that survives re-encoding and metadata changes, or
+    None for low-entropy images (blank pages, solid fills) that would match each other.
+    """
+    gray = img.convert("L")
+    small = np.asarray(gray.resize((PHASH_SIZE + 1, PHASH_SIZE), Image.BILINEAR, reducing_gap=2.0), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    n = int(bits.sum())
+    if n < PHASH_MIN_BITS or n > bits.size - PHASH_MIN_BITS:
+        return None
+    thumb = np.asarray(gray.resize((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR, reducing_gap=2.0), dtype=np.uint8)
+    return np.packbits(bits), thumb
+
+class PerceptualIndex:
+    """
+    Maps fingerprints of recently cached uploads to their content keys, so a re-saved
+    copy of the same scan can reuse the original's embedding.
+
+    A lookup takes the stored fingerprints within max_distance bits of the dHash and
+    accepts the closest one whose thumbnail differs by at most max_pixel_diff grey levels
+    everywhere. Oldest entries are overwritten once max_items is reached.
+    """
+    def __init__(self, max_items: int = 1024, max_distance: int = 32, max_pixel_diff: int = 16):
+        self.max_items = max(1, max_items)
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self._lock = threading.Lock()
+        self._bits = np.zeros((self.max_items, PHASH_SIZE * PHASH_SIZE // 8), dtype=np.uint8)
+        self._thumbs = np.zeros((self.max_items, THUMB_SIZE, THUMB_SIZE), dtype=np.uint8)
+        self._keys: List[Optional[str]] = [None] * self.max_items
+        self._count = 0
+        self._next = 0
+
+    def add(self, fp: Fingerprint, key: str) -> None:
+        with self._lock:
+            i = self._next
+            self._bits[i], self._thumbs[i] = fp
+            self._keys[i] = key
+            self._next = (i + 1) % self.max_items
+            self._count = min(self._count + 1, self.max_items)
+
+    def find(self, fp: Fingerprint, max_candidates: int = 4) -> Optional[str]:
+        bits, thumb = fp
+        with self._lock:
+            if not self._count:
+                return None
+            dist = np.unpackbits(self._bits[:self._count] ^ bits, axis=1).sum(axis=1)
+            for i in np.argsort(dist, kind="stable")[:max_candidates]:
+                if dist[i] > self.max_distance:
+                    break
+                diff = np.abs(self._thumbs[i].astype(np.int16) - thumb).max()
+                if diff <= self.max_pixel_diff:
+                    return self._keys[i]
+        return None
+
+# ---------------- CACHE ----------------
+LOG_COMPACT_FACTOR = 2   # keys.log is rewritten once it holds this many times disk_items lines
+class EmbeddingCache:
+    """
+    Two-tier float32 embedding cache.
+
+    - memory: LRU of up to memory_items vectors
+    - disk (optional): ring buffer of disk_items vectors in a memory-mapped file under
+      disk_dir, with an append-only key log replayed at startup
+
+    The disk tier is wiped when dim or namespace change, so embeddings produced by a
+    different model are never served.
+
+    Several worker processes may point at the same disk_dir: each one claims its own
+    worker-<n> shard under it with an exclusive file lock (held until close), so slot
+    allocation, truncation and log compaction never race. A restarted worker picks up a
+    free shard and its entries again; shards are not shared between live workers.
+    """
+    def __init__(
+        self,
+        dim: int,
+        memory_items: int = 2048,
+        disk_dir: Optional[str] = None,
+        disk_items: int = 100_000,
+        namespace: str = "",
+    ):
+        self.dim = dim
+        self.memory_items = max(0, memory_items)
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+        self._disk: Optional[np.memmap] = None
+        self._slot_of: Dict[str, int] = {}
+        self._key_at: Dict[int, str] = {}
+        self._next_slot = 0
+        self._log = None
+        self._log_path = ""
+        self._log_lines = 0
+        self._shard_lock = None
+        self.disk_dir: Optional[str] = None
+        if disk_dir:
+            self.disk_dir = self._claim_shard(disk_dir)
+            self._open_disk(self.disk_dir, max(1, disk_items))
+
+    def _claim_shard(self, disk_dir: str, max_shards: int = 256) -> str:
+        """Return the first worker-<n> directory under disk_dir no other live process holds."""
+        for n in range(max_shards):
+            shard = os.path.join(disk_dir, f"worker-{n}")
+            os.makedirs(shard, exist_ok=True)
+            fh = open(os.path.join(shard, ".lock"), "a+")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                fh.close()
+                continue
+            self._shard_lock = fh
+            return shard
+        raise RuntimeError(f"No free embedding cache shard under {disk_dir} ({max_shards} in use)")
+
+    def _open_disk(self, disk_dir: str, disk_items: int) -> None:
+        os.makedirs(disk_dir, exist_ok=True)
+        vec_path = os.path.join(disk_dir, "embeddings.f32")
+        log_path = os.path.join(disk_dir, "keys.log")
+        meta_path = os.path.join(disk_dir, "meta.json")
+        meta = {"dim": self.dim, "items": disk_items, "namespace": self.namespace}
+
+        reuse = False
+        if os.path.isfile(meta_path) and os.path.isfile(vec_path):
+            try:
+                with open(meta_path) as f:
+                    reuse = json.load(f) == meta
+            except (OSError, ValueError):
+                reuse = False
+
+        if reuse:
+            self._disk = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(disk_items, self.dim))
+            self._replay_log(log_path, disk_items)
+        else:
+            self._disk = np.memmap(vec_path, dtype=np.float32, mode="w+", shape=(disk_items, self.dim))
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+            open(log_path, "w").close()
+
+        self._log_path = log_path
+        self._log = open(log_path, "a", buffering=1)
+
+    def _replay_log(self, log_path: str, disk_items: int) -> None:
+        if not os.path.isfile(log_path):
+            return
+        last_slot = -1
+        with open(log_path) as f:
+            for line in f:
+                slot_s, _, key = line.rstrip("\n").partition("\t")
+                if not key:
+                    continue
+                slot = int(slot_s)
+                if not 0 <= slot < disk_items:
+                    continue
+                self._assign(slot, key)
+                last_slot = slot
+        self._next_slot = (last_slot + 1) % disk_items
+        self._write_log(log_path)
+
+    def _write_log(self, log_path: str) -> None:
+        """Rewrite the log as just the live entries, oldest first, so replay order holds."""
+        n = self._disk.shape[0]
+        tmp_path = log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for slot in sorted(self._key_at, key=lambda s: (s - self._next_slot) % n):
+                f.write(f"{slot}\t{self._key_at[slot]}\n")
+        os.replace(tmp_path, log_path)
+        self._log_lines = len(self._key_at)
+
+    def _assign(self, slot: int, key: str) -> None:
+        old = self._key_at.get(slot)
+        if old is not None:
+            self._slot_of.pop(old, None)
+        prev = self._slot_of.get(key)
+        if prev is not None:
+            self._key_at.pop(prev, None)
+        self._key_at[slot] = key
+        self._slot_of[key] = slot
+
+    def _remember(self, key: str, emb: np.ndarray) -> None:
+        if self.memory_items == 0:
+            return
+        self._lru[key] = emb
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_items:
+            self._lru.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            emb = self._lru.get(key)
+            if emb is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return emb
+            slot = self._slot_of.get(key)
+            if slot is not None and self._disk is not None:
+                emb = np.array(self._disk[slot])   # copy out of the mapping
+                self._remember(key, emb)
+                self.hits += 1
+                return emb
+            self.misses += 1
+            return None
+
+    def put(self, key: str, emb: np.ndarray) -> None:
+        # Own copy: a row view would keep the caller's whole (N, dim) batch alive in the LRU
+        emb = np.array(np.reshape(emb, self.dim), dtype=np.float32, copy=True)
+        with self._lock:
+            self._remember(key, emb)
+            if self._disk is None or self._log is None or key in self._slot_of:
+                return
+            slot = self._next_slot
+            self._disk[slot] = emb
+            self._assign(slot, key)
+            self._log.write(f"{slot}\t{key}\n")
+            self._next_slot = (slot + 1) % self._disk.shape[0]
+            self._log_lines += 1
+            # Keep the log (and the next startup's replay) proportional to the live entries
+            if self._log_lines > LOG_COMPACT_FACTOR * self._disk.shape[0]:
+                self._log.close()
+                self._write_log(self._log_path)
+                self._log = open(self._log_path, "a", buffering=1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._lru),
+                "disk_entries": len(self._slot_of),
+                "disk_dir": self.disk_dir,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._disk is not None:
+                self._disk.flush()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._shard_lock is not None:
+                self._shard_lock.close()   # releases the shard for the next worker
+                self._shard_lock = None
@@ -1,7 +1,21 @@
-
 # model_server.py
+import os
 import uvicorn
 
+SERVE_MODE = os.getenv("SERVE_MODE", "dev")      # dev: single worker with reload | prod: N workers, no reload
+WORKERS = int(os.getenv("WORKERS", 2))           # uvicorn worker processes in prod mode
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 6000))
+
 if __name__ == "__main__":
-    # "api:app" means: import `app` object from api.py
-    uvicorn.run("api:app", host="0.0.0.0", port=6000, reload=True)
+    if SERVE_MODE == "prod":
+        # Split the cores between workers so their torch thread pools don't oversubscribe.
+        # Workers share model pages when prepare_artifacts.py has been run (see api.py);
+        # for the ResNet weights only with INFERENCE_BACKEND=eager, the other backends
+        # build their own copy in every worker.
+        os.environ.setdefault("INFER_THREADS", str(max(1, (os.cpu_count() or 1) // WORKERS)))
+        os.environ.setdefault("INFER_INTEROP_THREADS", "1")
+        uvicorn.run("api:app", host=HOST, port=PORT, workers=WORKERS, reload=False)
+    else:
+        # "api:app" means: import `app` object from api.py
+        uvicorn.run("api:app", host=HOST, port=PORT, reload=True)
@@ -0,0 +1,200 @@
+# ood_scorer.py
+import logging
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("image_classifier")
+
+OOD_MODES = ("exact", "approx", "sklearn")
+EXACT_MAX_ERROR = 1e-3   # max |error| / score spread tolerated from float32 rounding
+
+class OODScorer:
+    """
+    Drop-in replacement for OneClassSVM.decision_function on batches of embeddings.
+
+        score(x) = sum_i dual_coef_i * K(sv_i, x) + intercept_
+
+    - exact:   kernel evaluated against a contiguous float32 copy of the support vectors,
+               so a whole batch is one BLAS matrix product
+    - approx:  Nystroem feature map on n_components landmark support vectors; the dual
+               coefficients fold into one weight vector, so cost no longer grows with the
+               number of support vectors
+    - sklearn: the fitted model's own decision_function
+
+    At construction the chosen mode is checked against the model's decision_function on
+    probe embeddings, including points bracketing the threshold, and falls back
+    (approx -> exact -> sklearn) when it disagrees on the OOD gate more often than
+    min_agreement or its max |error| exceeds max_error (as a fraction of the spread of
+    reference scores). The outcome is logged and kept in self.report.
+    """
+    def __init__(
+        self,
+        ocsvm: Any,
+        sv: Optional[np.ndarray] = None,
+        mode: str = "exact",
+        threshold: float = -1.0,
+        n_components: int = 256,
+        min_agreement: float = 0.99,
+        max_error: float = 0.05,
+        probe_size: int = 256,
+        random_state: int = 0,
+    ):
+        if mode not in OOD_MODES:
+            raise ValueError(f"Unknown OOD mode {mode!r}; expected one of {OOD_MODES}")
+        self.ocsvm = ocsvm
+        self.threshold = threshold
+        self.report: Dict[str, Any] = {"requested_mode": mode}
+
+        kernel = getattr(ocsvm, "kernel", None)
+        if mode != "sklearn" and (kernel not in ("linear", "rbf", "poly", "sigmoid")
+                                  or not hasattr(ocsvm, "support_vectors_")):
+            logger.warning("OOD scorer: unsupported detector (kernel=%r), using sklearn decision_function", kernel)
+            mode = "sklearn"
+
+        if mode != "sklearn":
+            self.kernel = kernel
+            self.gamma = float(getattr(ocsvm, "_gamma", ocsvm.gamma))
+            self.degree = int(getattr(ocsvm, "degree", 3))
+            self.coef0 = float(getattr(ocsvm, "coef0", 0.0))
+            # A float32 matrix passed in (e.g. memory-mapped and shared between workers) is used as is
+            self.sv = sv if sv is not None and sv.dtype == np.float32 and sv.flags.c_contiguous \
+                else np.ascontiguousarray(ocsvm.support_vectors_, dtype=np.float32)
+            self.sv_sq = np.einsum("ij,ij->i", self.sv, self.sv).astype(np.float64)
+            self.dual_coef = np.ascontiguousarray(ocsvm.dual_coef_, dtype=np.float64).ravel()
+            self.intercept = float(np.ravel(ocsvm.intercept_)[0])
+            # Linear kernel collapses to a single weight vector
+            self.linear_w = (self.dual_coef @ self.sv.astype(np.float64)).astype(np.float32) \
+                if kernel == "linear" else None
+            self.report["support_vectors"] = int(self.sv.shape[0])
+
+        self.mode = mode
+        self._nystroem = None
+        self._nystroem_w: Optional[np.ndarray] = None
+
+        if mode == "approx":
+            if kernel == "linear":
+                self.mode = "exact"   # already O(d) per sample
+            else:
+                self._fit_nystroem(n_components, random_state)
+
+        if self.mode != "sklearn":
+            self._verify(min_agreement, max_error, probe_size, random_state)
+        self.report["mode"] = self.mode
+
+    # ---------------- KERNELS ----------------
+    def _kernel(self, X: np.ndarray) -> np.ndarray:
+        dots = (X @ self.sv.T).astype(np.float64)          # (N, n_sv) float32 GEMM
+        if self.kernel == "rbf":
+            x_sq = np.einsum("ij,ij->i", X, X).astype(np.float64)
+            d2 = np.maximum(x_sq[:, None] + self.sv_sq[None, :] - 2.0 * dots, 0.0)
+            return np.exp(-self.gamma * d2)
+        if self.kernel == "poly":
+            return (self.gamma * dots + self.coef0) ** self.degree
+        return np.tanh(self.gamma * dots + self.coef0)     # sigmoid
+
+    def _exact(self, X: np.ndarray) -> np.ndarray:
+        if self.linear_w is not None:
+            return (X @ self.linear_w).astype(np.float64) + self.intercept
+        return self._kernel(X) @ self.dual_coef + self.intercept
+
+    def _fit_nystroem(self, n_components: int, random_state: int) -> None:
+        from sklearn.kernel_approximation import Nystroem
+
+        n = min(n_components, self.sv.shape[0])
+        self._nystroem = Nystroem(
+            kernel=self.kernel, gamma=self.gamma, degree=self.degree, coef0=self.coef0,
+            n_components=n, random_state=random_state,
+        ).fit(self.sv)
+        self._nystroem_w = (self.dual_coef @ self._nystroem.transform(self.sv)).astype(np.float32)
+        self.report["approx_components"] = n
+
+    def _approx(self, X: np.ndarray) -> np.ndarray:
+        return self._nystroem.transform(X).astype(np.float32) @ self._nystroem_w + self.intercept
+
+    # ---------------- VERIFICATION ----------------
+    def _reference(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(self.ocsvm.decision_function(X), dtype=np.float64)
+
+    def _probes(self, probe_size: int, random_state: int, bisect_steps: int = 7) -> Tuple[np.ndarray, int]:
+        """
+        Support vectors (in-distribution), feature-shuffled copies of them (OOD), and for
+        every inside/outside pair the gate separates, the two points bracketing the
+        threshold on the segment between them, where a small scoring error flips the gate.
+        A shuffled copy that still passes the gate (e.g. features that are alike) is pushed
+        further out along the same direction until it does not.
+        Returns the probes and how many of them (the last rows) are near the threshold.
+        """
+        rng = np.random.default_rng(random_state)
+        idx = rng.choice(self.sv.shape[0], size=min(probe_size // 2 or 1, self.sv.shape[0]), replace=False)
+        inside = self.sv[idx].astype(np.float64)
+        outside = rng.permuted(inside, axis=1)
+
+        side = self._reference(inside) >= self.threshold
+        d = outside - inside
+        cross = side != (self._reference(outside) >= self.threshold)
+        for factor in (2.0, 4.0, 8.0, 16.0):
+            todo = np.flatnonzero(~cross)
+            if not len(todo):
+                break
+            hit = (self._reference(inside[todo] + factor * d[todo]) >= self.threshold) != side[todo]
+            d[todo[hit]] *= factor
+            cross[todo[hit]] = True
+        a, d, side = inside[cross], d[cross], side[cross]
+        lo, hi = np.zeros(len(a)), np.ones(len(a))     # a + lo*d on a's side of the gate, a + hi*d not
+        for _ in range(bisect_steps if len(a) else 0):
+            mid = (lo + hi) / 2
+            same = (self._reference(a + mid[:, None] * d) >= self.threshold) == side
+            lo, hi = np.where(same, mid, lo), np.where(same, hi, mid)
+        near = np.vstack([a + lo[:, None] * d, a + hi[:, None] * d])
+
+        X = np.ascontiguousarray(np.vstack([inside, outside, near]), dtype=np.float32)
+        return X, len(near)
+
+    def _agreement(self, fn, X: np.ndarray, ref: np.ndarray, n_near: int) -> Dict[str, Any]:
+        got = fn(X)
+        gate = (got >= self.threshold) == (ref >= self.threshold)
+        max_abs_error = float(np.max(np.abs(got - ref)))
+        return {
+            "gate_agreement": float(np.mean(gate)),
+            "near_threshold_agreement": float(np.mean(gate[-n_near:])) if n_near else None,
+            "max_abs_error": max_abs_error,
+            # relative to the spread of reference scores, so the bound is independent of model scale
+            "rel_error": max_abs_error / (float(np.std(ref)) + 1e-12),
+        }
+
+    def _check(self, mode: str, fn, X: np.ndarray, ref: np.ndarray, n_near: int,
+               min_agreement: float, max_error: float) -> bool:
+        res = self._agreement(fn, X, ref, n_near)
+        self.report[f"{mode}_check"] = res
+        near = "n/a" if res["near_threshold_agreement"] is None else f"{100 * res['near_threshold_agreement']:.2f}%"
+        logger.info("OOD scorer %s: gate agreement %.2f%% (near threshold %s over %d probes), "
+                    "max |error| %.4g (%.2g of score spread, limit %.2g)",
+                    mode, 100 * res["gate_agreement"], near, n_near,
+                    res["max_abs_error"], res["rel_error"], max_error)
+        return res["gate_agreement"] >= min_agreement and res["rel_error"] <= max_error
+
+    def _verify(self, min_agreement: float, max_error: float, probe_size: int, random_state: int) -> None:
+        X, n_near = self._probes(probe_size, random_state)
+        ref = self._reference(X)
+        self.report["probes"] = int(X.shape[0])
+
+        if self.mode == "approx":
+            if self._check("approx", self._approx, X, ref, n_near, min_agreement, max_error):
+                return
+            logger.warning("OOD scorer approx outside limits (min agreement %.2f%%, max error %.2g), falling back to exact",
+                           100 * min_agreement, max_error)
+            self.mode = "exact"
+
+        # The exact path differs from sklearn only by float32 rounding
+        if not self._check("exact", self._exact, X, ref, n_near, min_agreement, EXACT_MAX_ERROR):
+            logger.warning("OOD scorer exact path disagrees with decision_function, using sklearn")
+            self.mode = "sklearn"
+
+    # ---------------- PUBLIC ----------------
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """Same semantics as OneClassSVM.decision_function: higher is more in-distribution."""
+        if self.mode == "sklearn":
+            return np.asarray(self.ocsvm.decision_function(X), dtype=np.float64)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self._approx(X) if self.mode == "approx" else self._exact(X)
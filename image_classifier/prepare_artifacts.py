@@ -0,0 +1,77 @@
+# prepare_artifacts.py
+"""
+Write the shared, memory-mappable model artifacts used by multi-worker serving.
+
+    python prepare_artifacts.py
+
+- resnet50_embed.pt: embedding-model state dict, loaded with torch.load(mmap=True) so
+  every worker maps the same file pages instead of holding its own copy. This only
+  holds for INFERENCE_BACKEND=eager: torchscript, channels_last and int8 derive new
+  weight tensors at startup, so each worker again holds its own copy (/health reports
+  resnet_weights_shared)
+- ood_sv_f32.npy:    OneClassSVM support vectors as contiguous float32 for the OOD scorer
+- id_classifier.pkl / ood_detector.pkl are re-dumped uncompressed only with --redump,
+  since joblib cannot memory-map arrays from compressed pickles
+
+Re-run after retraining the sklearn models or changing RESNET_LOCAL_WEIGHTS. The
+weights file records a fingerprint of its source (content hash of RESNET_LOCAL_WEIGHTS,
+or the torchvision checkpoint name); api.py ignores it when that no longer matches.
+Nothing is written if the pretrained weights cannot be loaded.
+"""
+import os
+import sys
+import argparse
+
+# Build everything from the original sources, not from previously written artifacts
+os.environ["RESNET_SHARED_WEIGHTS"] = ""
+os.environ["OOD_SV_PATH"] = ""
+os.environ["MODEL_MMAP_MODE"] = ""
+os.environ["INFERENCE_BACKEND"] = "eager"
+os.environ["OOD_MODE"] = "sklearn"
+os.environ["EMB_CACHE_ITEMS"] = "0"
+os.environ["EMB_CACHE_DIR"] = ""
+
+import numpy as np
+import torch
+import joblib
+
+import api
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out-dir", default=api.MODELS_DIR, help="where to write the artifacts (default: MODELS_DIR)")
+    ap.add_argument("--redump", action="store_true", help="rewrite the sklearn pickles uncompressed in place")
+    args = ap.parse_args()
+    if not api.RESNET_PRETRAINED:
+        print("ResNet50 pretrained weights unavailable (download failed and no RESNET_LOCAL_WEIGHTS); "
+              "refusing to write random-init artifacts", file=sys.stderr)
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    weights_path = os.path.join(args.out_dir, "resnet50_embed.pt")
+    torch.save(
+        {
+            "state_dict": api.resnet.state_dict(),
+            "pretrained": api.RESNET_PRETRAINED,
+            "source": api.RESNET_SOURCE,
+        },
+        weights_path,
+    )
+    print(f"wrote {weights_path} (pretrained={api.RESNET_PRETRAINED}, source={api.RESNET_SOURCE})")
+
+    if hasattr(api.ocsvm, "support_vectors_"):
+        sv_path = os.path.join(args.out_dir, "ood_sv_f32.npy")
+        np.save(sv_path, np.ascontiguousarray(api.ocsvm.support_vectors_, dtype=np.float32))
+        print(f"wrote {sv_path} {api.ocsvm.support_vectors_.shape}")
+    else:
+        print("ood_detector has no support_vectors_; skipping ood_sv_f32.npy", file=sys.stderr)
+
+    if args.redump:
+        for obj, path in ((api.clf, api.ID_CLF_PATH), (api.ocsvm, api.OOD_PATH)):
+            joblib.dump(obj, path, compress=0)
+            print(f"re-dumped {path} uncompressed")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Modules under image_classifier/ import each other by bare name (as uvicorn runs them)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
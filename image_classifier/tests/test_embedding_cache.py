@@ -0,0 +1,160 @@
+# test_embedding_cache.py
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from embedding_cache import EmbeddingCache, PerceptualIndex, content_key, perceptual_fingerprint
+
+DIM = 8
+
+def vec(i: int) -> np.ndarray:
+    return np.full(DIM, i, dtype=np.float32)
+
+def card(text: str) -> Image.Image:
+    img = Image.new("RGB", (640, 400), (230, 225, 210))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, 640, 60], fill=(40, 60, 120))
+    draw.rectangle([30, 100, 200, 320], fill=(120, 120, 130))
+    draw.text((230, 120), text, fill=(20, 20, 20), font_size=28)
+    draw.text((230, 180), "DOB 01/01/1990", fill=(20, 20, 20), font_size=28)
+    return img
+
+def textured(seed: int = 0) -> Image.Image:
+    px = np.random.default_rng(seed).integers(0, 256, (400, 640, 3), dtype=np.uint8)
+    return Image.fromarray(px)
+
+def reencode(img: Image.Image, quality: int) -> Image.Image:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buf.getvalue())).convert("RGB")
+
+def test_content_key():
+    assert content_key("ab") == "sha256:ab"
+    assert content_key("ab", page=2) == "sha256:ab:p2"
+
+def test_low_entropy_images_have_no_fingerprint():
+    for colour in ((255, 255, 255), (0, 0, 0), (200, 10, 10)):
+        assert perceptual_fingerprint(Image.new("RGB", (640, 400), colour)) is None
+
+def test_reencoded_copy_matches():
+    index = PerceptualIndex(max_items=8)
+    for name, img in (("card", card("ALICE 1234 5678")), ("texture", textured())):
+        index.add(perceptual_fingerprint(reencode(img, 95)), name)
+        assert index.find(perceptual_fingerprint(reencode(img, 70))) == name
+
+def test_different_images_do_not_collide():
+    index = PerceptualIndex(max_items=8)
+    index.add(perceptual_fingerprint(card("ALICE 1234 5678")), "alice")
+    index.add(perceptual_fingerprint(textured(0)), "texture-0")
+    assert index.find(perceptual_fingerprint(card("BOB 9999 0000"))) is None
+    assert index.find(perceptual_fingerprint(card("ALICE 1234 5679"))) is None   # one digit changed
+    assert index.find(perceptual_fingerprint(textured(1))) is None
+
+def test_perceptual_index_overwrites_oldest():
+    index = PerceptualIndex(max_items=1)
+    index.add(perceptual_fingerprint(card("ALICE 1234 5678")), "alice")
+    index.add(perceptual_fingerprint(textured()), "texture")
+    assert index.find(perceptual_fingerprint(card("ALICE 1234 5678"))) is None
+    assert index.find(perceptual_fingerprint(textured())) == "texture"
+
+def test_put_get_memory_only():
+    cache = EmbeddingCache(DIM, memory_items=4)
+    assert cache.get("a") is None
+    cache.put("a", vec(1))
+    np.testing.assert_array_equal(cache.get("a"), vec(1))
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_put_copies_batch_row():
+    batch = np.stack([vec(1), vec(2)])
+    cache = EmbeddingCache(DIM, memory_items=4)
+    cache.put("a", batch[0])
+    batch[0] = 99
+    np.testing.assert_array_equal(cache.get("a"), vec(1))
+    assert cache.get("a").base is None
+
+def test_lru_eviction():
+    cache = EmbeddingCache(DIM, memory_items=2)
+    cache.put("a", vec(1))
+    cache.put("b", vec(2))
+    cache.get("a")            # b is now least recently used
+    cache.put("c", vec(3))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_disk_ring_buffer_reuses_slots(tmp_path):
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=2)
+    for i, key in enumerate("abc"):
+        cache.put(key, vec(i))
+    assert cache.get("a") is None       # overwritten by c
+    np.testing.assert_array_equal(cache.get("b"), vec(1))
+    np.testing.assert_array_equal(cache.get("c"), vec(2))
+    assert cache.stats()["disk_entries"] == 2
+    cache.close()
+
+def test_replay_after_reopen(tmp_path):
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=3, namespace="m1")
+    for i, key in enumerate("abcd"):
+        cache.put(key, vec(i))
+    cache.close()
+
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=3, namespace="m1")
+    assert cache.get("a") is None
+    for i, key in enumerate("bcd", start=1):
+        np.testing.assert_array_equal(cache.get(key), vec(i))
+    # Replay resumes the ring after the newest entry, so b (the oldest) goes next
+    cache.put("e", vec(4))
+    assert cache.get("b") is None
+    np.testing.assert_array_equal(cache.get("c"), vec(2))
+    cache.close()
+
+    with open(os.path.join(cache.disk_dir, "keys.log")) as f:
+        assert len(f.readlines()) <= 4   # compacted to the live entries plus new appends
+
+def test_namespace_change_wipes_disk(tmp_path):
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=4, namespace="m1")
+    cache.put("a", vec(1))
+    cache.close()
+
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=4, namespace="m2")
+    assert cache.get("a") is None
+    assert cache.stats()["disk_entries"] == 0
+    cache.close()
+
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=4, namespace="m2")
+    assert cache.get("a") is None
+    cache.close()
+
+def test_concurrent_caches_get_separate_shards(tmp_path):
+    first = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=2)
+    second = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=2)
+    assert first.disk_dir != second.disk_dir
+    first.put("a", vec(1))
+    second.put("b", vec(2))
+    assert second.get("a") is None
+    np.testing.assert_array_equal(first.get("a"), vec(1))
+    first.close()
+    second.close()
+
+    # A released shard is picked up again, entries included
+    again = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=2)
+    assert again.disk_dir == first.disk_dir
+    np.testing.assert_array_equal(again.get("a"), vec(1))
+    again.close()
+
+def test_key_log_compacted_while_running(tmp_path):
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=3)
+    for i in range(20):
+        cache.put(f"k{i}", vec(i))
+        with open(os.path.join(cache.disk_dir, "keys.log")) as f:
+            assert len(f.readlines()) <= 2 * 3
+    cache.close()
+
+    cache = EmbeddingCache(DIM, memory_items=0, disk_dir=str(tmp_path), disk_items=3)
+    assert cache.get("k16") is None
+    for i in (17, 18, 19):
+        np.testing.assert_array_equal(cache.get(f"k{i}"), vec(i))
+    cache.put("k20", vec(20))      # replaces the oldest, k17
+    assert cache.get("k17") is None
+    cache.close()
@@ -0,0 +1,65 @@
+# test_ood_scorer.py
+import numpy as np
+import pytest
+from sklearn.svm import OneClassSVM
+
+import ood_scorer
+from ood_scorer import OODScorer
+
+KERNELS = {
+    "rbf": dict(gamma=0.05),
+    "poly": dict(gamma=0.05, degree=3, coef0=1.0),
+    "sigmoid": dict(gamma=0.01, coef0=0.0),
+    "linear": dict(),
+}
+
+def fit(kernel: str, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = (rng.normal(size=(400, 16)) + 1.0).astype(np.float32)
+    ocsvm = OneClassSVM(kernel=kernel, nu=0.1, **KERNELS[kernel]).fit(X)
+    # Held-out embeddings: in-distribution plus shifted ones, threshold at the 20th percentile
+    test = np.vstack([rng.normal(size=(200, 16)) + 1.0, rng.normal(size=(100, 16)) * 2.0 - 1.0]).astype(np.float32)
+    threshold = float(np.percentile(ocsvm.decision_function(test), 20))
+    return ocsvm, test, threshold
+
+def gate_agreement(scorer: OODScorer, ocsvm, X: np.ndarray, threshold: float) -> float:
+    return float(np.mean((scorer.decision_function(X) >= threshold) == (ocsvm.decision_function(X) >= threshold)))
+
+@pytest.mark.parametrize("kernel", sorted(KERNELS))
+def test_exact_matches_sklearn(kernel):
+    ocsvm, test, threshold = fit(kernel)
+    scorer = OODScorer(ocsvm, mode="exact", threshold=threshold)
+    assert scorer.mode == "exact"
+    np.testing.assert_allclose(scorer.decision_function(test), ocsvm.decision_function(test), rtol=1e-4, atol=1e-4)
+    assert gate_agreement(scorer, ocsvm, test, threshold) >= 0.99
+
+@pytest.mark.parametrize("kernel", sorted(KERNELS))
+def test_approx_gate_agreement(kernel):
+    ocsvm, test, threshold = fit(kernel)
+    # As many components as support vectors: Nystroem is then exact up to rounding
+    scorer = OODScorer(ocsvm, mode="approx", threshold=threshold, n_components=ocsvm.support_vectors_.shape[0])
+    assert scorer.mode == ("exact" if kernel == "linear" else "approx")
+    assert gate_agreement(scorer, ocsvm, test, threshold) >= 0.99
+
+def test_approx_outside_error_bound_falls_back_to_exact():
+    ocsvm, test, threshold = fit("rbf")
+    scorer = OODScorer(ocsvm, mode="approx", threshold=threshold, n_components=4, max_error=1e-9)
+    assert scorer.mode == "exact"
+    assert scorer.report["approx_check"]["rel_error"] > 1e-9
+    assert gate_agreement(scorer, ocsvm, test, threshold) >= 0.99
+
+def test_exact_outside_error_bound_falls_back_to_sklearn(monkeypatch):
+    monkeypatch.setattr(ood_scorer, "EXACT_MAX_ERROR", -1.0)
+    ocsvm, test, threshold = fit("rbf")
+    scorer = OODScorer(ocsvm, mode="approx", threshold=threshold, n_components=4, max_error=1e-9)
+    assert scorer.mode == "sklearn"
+    assert "approx_check" in scorer.report and "exact_check" in scorer.report
+    np.testing.assert_array_equal(scorer.decision_function(test), ocsvm.decision_function(test))
+
+def test_probes_bracket_threshold():
+    ocsvm, _, threshold = fit("rbf")
+    scorer = OODScorer(ocsvm, mode="exact", threshold=threshold)
+    X, n_near = scorer._probes(256, 0)
+    assert n_near > 0
+    near = ocsvm.decision_function(X[-n_near:])
+    assert (near >= threshold).any() and (near < threshold).any()